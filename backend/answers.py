@@ -0,0 +1,162 @@
+import re
+
+'''
+Server side answer checking.
+
+Answers are normalized once, when a question is inserted or the first
+time it is graded, and cached per question id. Grading a guess then only
+normalizes the guess and compares it against the cached entry.
+'''
+
+ARTICLES = {'a', 'an', 'the'}
+MAX_EDIT_DISTANCE = 2
+
+# a single word of the answer only counts as a correct guess if it is
+# not one of these and has at least MIN_KEYWORD_LENGTH letters
+STOPWORDS = ARTICLES | {'and', 'from', 'into', 'onto', 'over', 'than',
+                        'that', 'this', 'upon', 'with', 'were', 'what'}
+MIN_KEYWORD_LENGTH = 4
+
+_APOSTROPHES = re.compile(r"['\u2019]")
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_DIGIT = re.compile(r'\d')
+
+
+def _numbers(words):
+  # words holding a digit (years, "13" in "Apollo 13") must match exactly
+  return tuple(word for word in words if _DIGIT.search(word))
+
+
+'''
+normalize_answer(text)
+    case folds text, splits words on punctuation ("Jean-Paul" is
+    "jean paul", apostrophes are dropped so "O'Keeffe" is "okeeffe") and
+    drops the articles "a", "an" and "the". An answer made only of
+    articles is kept as is.
+'''
+def normalize_answer(text):
+  text = _APOSTROPHES.sub('', text.casefold())
+  words = _PUNCTUATION.sub(' ', text).split()
+  kept = [word for word in words if word not in ARTICLES]
+  return ' '.join(kept or words)
+
+
+'''
+within_distance(a, b, max_distance)
+    True if the edit distance between a and b is at most max_distance.
+    Only the diagonal band of width 2 * max_distance + 1 is computed,
+    so this runs in O(len(a) * max_distance).
+'''
+def within_distance(a, b, max_distance):
+  if abs(len(a) - len(b)) > max_distance:
+    return False
+  if max_distance == 0:
+    return a == b
+
+  k = max_distance
+  over = k + 1
+  width = 2 * k + 1
+  # row[d] holds the distance between a[:i] and b[:j] where j = i - k + d
+  previous = [j if 0 <= j <= len(b) else over for j in range(-k, k + 1)]
+
+  for i in range(1, len(a) + 1):
+    current = [over] * width
+    for d in range(width):
+      j = i - k + d
+      if j < 0 or j > len(b):
+        continue
+      if j == 0:
+        current[d] = i
+        continue
+      best = previous[d] + (a[i - 1] != b[j - 1])
+      if d + 1 < width:
+        best = min(best, previous[d + 1] + 1)
+      if d > 0:
+        best = min(best, current[d - 1] + 1)
+      current[d] = min(best, over)
+    if min(current) > k:
+      return False
+    previous = current
+
+  return previous[len(b) - len(a) + k] <= k
+
+
+class _Entry(object):
+
+  def __init__(self, answer):
+    self.answer = answer
+    self.normalized = normalize_answer(answer)
+    self.keywords = frozenset(word for word in self.normalized.split()
+                              if len(word) >= MIN_KEYWORD_LENGTH and word not in STOPWORDS)
+    self.numbers = _numbers(self.normalized.split())
+
+
+'''
+AnswerIndex
+    caches the normalized answer of each question id. load_answer(id)
+    returns the stored answer text, or None if there is no such question,
+    and is only called for ids that are not cached yet. max_distance is
+    the number of typos accepted in a guess, capped at MAX_EDIT_DISTANCE.
+    If given, exists(id) is called when a cached entry is used, so a
+    question deleted by another process is not graded from the cache.
+'''
+class AnswerIndex(object):
+
+  def __init__(self, load_answer, max_distance=0, exists=None):
+    self.load_answer = load_answer
+    self.exists = exists
+    self.max_distance = max(0, min(max_distance, MAX_EDIT_DISTANCE))
+    self._entries = {}
+
+  def add(self, question_id, answer):
+    self._entries[int(question_id)] = _Entry(answer)
+
+  def remove(self, question_id):
+    self._entries.pop(int(question_id), None)
+
+  def clear(self):
+    self._entries = {}
+
+  def entry(self, question_id):
+    question_id = int(question_id)
+    entry = self._entries.get(question_id)
+    if entry is not None and self.exists is not None and not self.exists(question_id):
+      self.remove(question_id)
+      return None
+    if entry is None:
+      answer = self.load_answer(question_id)
+      if answer is None:
+        return None
+      entry = _Entry(answer)
+      self._entries[question_id] = entry
+    return entry
+
+  def check(self, question_id, guess):
+    '''
+    returns (correct, answer) for the guess, or None if the question does
+    not exist. A guess is correct when it is within max_distance edits of
+    the whole answer or of one of its keywords. Keywords allow at most one
+    edit per four letters, so short words are never matched loosely, and
+    words with digits in them never allow edits.
+    '''
+    entry = self.entry(question_id)
+    if entry is None:
+      return None
+
+    guess = normalize_answer(guess)
+    if guess == '':
+      return False, entry.answer
+
+    def keyword_distance(word):
+      if _DIGIT.search(word):
+        return 0
+      return min(self.max_distance, len(word) // 4)
+
+    correct = (
+      guess == entry.normalized or
+      guess in entry.keywords or
+      (_numbers(guess.split()) == entry.numbers and
+       within_distance(guess, entry.normalized, self.max_distance)) or
+      any(within_distance(guess, word, keyword_distance(word))
+          for word in entry.keywords))
+    return correct, entry.answer
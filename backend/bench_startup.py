@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+'''
+Startup benchmark
+
+Measures how long a fresh process takes to import flaskr and run
+create_app(). Each run is a new interpreter so module imports are part
+of the measurement, the same as a worker starting cold.
+
+  python bench_startup.py                  # lazy startup (default)
+  python bench_startup.py --create-tables  # old behaviour, needs postgres
+  python bench_startup.py --warmup         # also time the pre-fork warmup(app)
+'''
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+RUN = '''
+import os, json, time
+started = time.perf_counter()
+from flaskr import create_app, warmup
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+result = {"import": imported - started, "create_app": created - imported}
+if os.environ.get("BENCH_WARMUP") == "1":
+  warmup(app)
+  result["warmup"] = time.perf_counter() - created
+print(json.dumps(result))
+'''
+
+
+def run_once(env):
+  output = subprocess.check_output([sys.executable, '-c', RUN], cwd=BACKEND_DIR, env=env)
+  return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+  parser = argparse.ArgumentParser(description='measure create_app startup time')
+  parser.add_argument('--runs', type=int, default=20)
+  parser.add_argument('--create-tables', action='store_true')
+  parser.add_argument('--warmup', action='store_true')
+  parser.add_argument('--snapshot', help='serve from this snapshot file instead of postgres')
+  args = parser.parse_args()
+
+  env = dict(os.environ)
+  env['TRIVIA_CREATE_TABLES'] = '1' if args.create_tables else '0'
+  env['BENCH_WARMUP'] = '1' if args.warmup else '0'
+  env.pop('TRIVIA_PROFILE_STARTUP', None)
+  if args.snapshot:
+    env['TRIVIA_SNAPSHOT'] = os.path.abspath(args.snapshot)
+  else:
+    env.pop('TRIVIA_SNAPSHOT', None)
+
+  results = [run_once(env) for _ in range(args.runs)]
+  steps = ['import', 'create_app'] + (['warmup'] if args.warmup else [])
+  for step in steps:
+    timings = [r[step] * 1000 for r in results]
+    print('{:<10} median {:8.2f} ms   min {:8.2f} ms   max {:8.2f} ms'.format(
+      step, statistics.median(timings), min(timings), max(timings)))
+
+
+if __name__ == '__main__':
+  main()
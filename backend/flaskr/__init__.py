@@ -1,18 +1,97 @@
 import os
+import time
 from flask import Flask, request, abort, jsonify
-from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS, cross_origin
+from sqlalchemy import inspect
+from sqlalchemy.orm import configure_mappers
 import random
-import json
 
-from models import setup_db, Question, Category
+from models import setup_db, db, Question, Category
+from snapshot import SnapshotStore
+from answers import AnswerIndex
 
 QUESTIONS_PER_PAGE = 10
+# questions.id is a postgres integer column
+MAX_QUESTION_ID = 2**31 - 1
+
+def is_int(value, low, high):
+  # json true/false are bools, which are ints in python
+  return isinstance(value, int) and not isinstance(value, bool) and low <= value <= high
+
+'''
+warmup(app)
+    pre-fork hook, run it once in the master process after the app is
+    loaded and before workers are forked (see the gunicorn example in the
+    README). It configures the ORM mappers and fills the answer index with
+    every question, reading the snapshot pages in snapshot mode, so forked
+    workers start with both. Database connections are not kept: the pool
+    is disposed so workers never share a socket, each worker connects on
+    its first request.
+'''
+def warmup(app):
+  store = app.extensions['trivia_snapshot']
+  answer_index = app.extensions['trivia_answers']
+
+  with app.app_context():
+    configure_mappers()
+    if store is not None:
+      answers = store.answers()
+    else:
+      answers = db.session.query(Question.id, Question.answer).all()
+
+  if store is None:
+    db.engine.dispose()
+
+  for question_id, answer in answers:
+    if isinstance(answer, str):
+      answer_index.add(question_id, answer)
 
 def create_app(test_config=None):
   # create and configure the app
+  started = time.perf_counter()
   app = Flask(__name__)
-  setup_db(app)
+  app.config['CREATE_TABLES'] = os.environ.get('TRIVIA_CREATE_TABLES') == '1'
+  app.config['PROFILE_STARTUP'] = os.environ.get('TRIVIA_PROFILE_STARTUP') == '1'
+  # typos accepted by /quizzes/answer, at most answers.MAX_EDIT_DISTANCE
+  app.config['ANSWER_MAX_DISTANCE'] = int(os.environ.get('TRIVIA_ANSWER_MAX_DISTANCE', '0'))
+  if test_config is not None:
+    app.config.update(test_config)
+
+  # startup profile mode: print how long each startup step took
+  profile = []
+  def mark(step):
+    if app.config['PROFILE_STARTUP']:
+      profile.append((step, time.perf_counter()))
+  mark('flask')
+
+  # read-only mode: serve questions and categories from a snapshot file
+  # (see snapshot.py) without ever connecting to the database
+  store = None
+  snapshot_path = app.config.get('SNAPSHOT_PATH', os.environ.get('TRIVIA_SNAPSHOT'))
+  if snapshot_path:
+    store = SnapshotStore(snapshot_path)
+  else:
+    setup_db(app, create_tables=app.config['CREATE_TABLES'])
+  mark('setup_db')
+
+  # normalized answers used by /quizzes/answer, loaded by question id
+  # on first use and added directly when a question is inserted
+  def load_answer(question_id):
+    if store is not None:
+      return store.answer(question_id)
+    return db.session.query(Question.answer).filter(Question.id == question_id).scalar()
+
+  # each worker has its own cache, a delete handled by another worker
+  # is seen through this id-only primary key lookup
+  def question_exists(question_id):
+    return db.session.query(Question.id).filter(Question.id == question_id).first() is not None
+
+  answer_index = AnswerIndex(load_answer, app.config['ANSWER_MAX_DISTANCE'],
+                             question_exists if store is None else None)
+
+  # used by warmup()
+  app.extensions['trivia_snapshot'] = store
+  app.extensions['trivia_answers'] = answer_index
   
   '''
   @TODO: Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
@@ -28,6 +107,12 @@ def create_app(test_config=None):
     response.headers.add('Access-Control-Allow-METHODS', 'GET,PATCH,POST,DELETE,OPTIONS')
     #print (response.headers)
     return response
+
+  # pick up a snapshot that was exported over the served one
+  @app.before_request
+  def reload_snapshot():
+    if store is not None and store.reload_if_changed():
+      answer_index.clear()
   
 
   @app.route('/')
@@ -43,6 +128,11 @@ def create_app(test_config=None):
   '''
   @app.route('/categories', methods=['GET'])
   def get_categories():
+    if store is not None:
+      return jsonify({
+        "categories": store.categories()
+      })
+
     categories = Category.query.all()
     result = {}
     for c in categories:
@@ -71,6 +161,15 @@ def create_app(test_config=None):
       abort(422)
 
     page_size = 10
+    if store is not None:
+      questionsResult = store.questions(page, page_size)
+      return jsonify({
+        "totalQuestions": len(questionsResult),
+        "questions": questionsResult,
+        "categories": store.categories(),
+        "currentCategory": "-"
+      })
+
     questions = Question.query.filter().limit(page_size).offset((page-1)*page_size).all()
 
     questionsResult = []
@@ -101,6 +200,9 @@ def create_app(test_config=None):
 
   @app.route('/questions/<question_id>', methods=['DELETE'])
   def delete_questions(question_id):
+    if store is not None:
+      abort(405)
+
     error = False
     
     try:
@@ -110,6 +212,7 @@ def create_app(test_config=None):
         error = True
       else:
         question.delete()
+        answer_index.remove(question_id)
 
     except:
       error = True
@@ -138,6 +241,9 @@ def create_app(test_config=None):
   @app.route('/questions', methods=['POST'])
   def add_question():
     print("add question")
+    if store is not None:
+      abort(405)
+
     data = request.get_json()
     question = Question(question=data["question"],
                           answer=data["answer"],
@@ -151,6 +257,12 @@ def create_app(test_config=None):
       abort(404)
     finally:
       question.close()
+
+    # reading question.id here would reload the committed row, the id is
+    # taken from the identity key instead. answers that are not text are
+    # left to be loaded when they are first graded
+    if isinstance(data["answer"], str):
+      answer_index.add(inspect(question).identity[0], data["answer"])
     
     return jsonify({
       "success": True
@@ -177,13 +289,15 @@ def create_app(test_config=None):
     
     searchTerm = data["searchTerm"]
     print(searchTerm)
-    questions = Question.query.filter(Question.question.ilike('%'+searchTerm+'%')).all()
-
-    if (len(questions)>0):
+    if store is not None:
+      questionResults = store.search(searchTerm)
+    else:
+      questions = Question.query.filter(Question.question.ilike('%'+searchTerm+'%')).all()
       questionResults = []
       for question in questions:
         questionResults.append(question.format())
 
+    if (len(questionResults)>0):
       return jsonify({
         "totalQuestions": len(questionResults),
         "questions": questionResults,
@@ -201,6 +315,17 @@ def create_app(test_config=None):
   '''
   @app.route("/categories/<category_id>/questions", methods=['GET'])
   def get_questions_by_categories(category_id):
+    if store is not None:
+      categoryType = store.category_type(category_id)
+      if categoryType is None:
+        abort(422)
+      questionResults = store.questions_by_category(category_id)
+      return jsonify({
+        "totalQuestions": len(questionResults),
+        "questions": questionResults,
+        "currentCategory": categoryType
+      })
+
     error = False
     try:
       category = Category.query.filter(Category.id==category_id).first()
@@ -244,6 +369,22 @@ def create_app(test_config=None):
     if "previous_questions" in data:
       previous_questions = data["previous_questions"]
 
+    if store is not None:
+      category_id = None
+      # the frontend sends id 0 when "ALL" is picked
+      if "quiz_category" in data and data["quiz_category"]["id"]:
+        category_id = data["quiz_category"]["id"]
+      snapshot, slots = store.quiz_candidates(category_id, previous_questions)
+      result = {}
+      if len(slots) > 0:
+        question = snapshot.record(slots[random.randint(0, len(slots)-1)])
+        # answers are checked by /quizzes/answer
+        del question["answer"]
+        result = {
+          "question": question
+        }
+      return jsonify(result)
+
     if "quiz_category" in data:
       quiz_category = data["quiz_category"]
       category = Category.query.get(quiz_category['id'])
@@ -263,13 +404,45 @@ def create_app(test_config=None):
 
     result = {}
     if len(filteredQuestions) > 0:
+      question = filteredQuestions[random.randint(0, len(filteredQuestions)-1)].format()
+      # answers are checked by /quizzes/answer
+      del question["answer"]
       result = {
-        "question" : filteredQuestions[random.randint(0, len(filteredQuestions)-1)].format()
+        "question" : question
       }
 
 
     return jsonify(result)
 
+  '''
+  Check the player's answer to a quiz question on the server.
+  The guess is compared with the normalized answer (case, punctuation
+  and articles ignored), allowing as many typos as the server's
+  ANSWER_MAX_DISTANCE setting.
+  '''
+  @app.route('/quizzes/answer', methods=['POST'])
+  def check_answer():
+    data = request.get_json()
+
+    if data is None or "question_id" not in data or "answer" not in data:
+      abort(400)
+
+    if not is_int(data["question_id"], 1, MAX_QUESTION_ID) or \
+       not isinstance(data["answer"], str):
+      abort(400)
+
+    result = answer_index.check(data["question_id"], data["answer"])
+
+    if result is None:
+      abort(404)
+
+    correct, answer = result
+    return jsonify({
+      "success": True,
+      "correct": correct,
+      "answer": answer
+    })
+
   '''
   @TODO: 
   Create error handlers for all expected errors 
@@ -294,6 +467,14 @@ def create_app(test_config=None):
       "message": "Not Found"
     }), 404
 
+  @app.errorhandler(405)
+  def method_not_allowed(error):
+    return jsonify({
+      "success": False,
+      "error": 405,
+      "message": "Method not allowed"
+    }), 405
+
   @app.errorhandler(422)
   def unprocessable_entity(error):
     return jsonify({
@@ -301,7 +482,15 @@ def create_app(test_config=None):
       "error": 422,
       "message": "Unprocessable entity"
     }), 422
-  
+  mark('routes')
+
+  if app.config['PROFILE_STARTUP']:
+    last = started
+    for step, at in profile:
+      print("startup {:<10} {:8.2f} ms".format(step, (at - last) * 1000))
+      last = at
+    print("startup {:<10} {:8.2f} ms".format("total", (last - started) * 1000))
+
   return app
 
     
\ No newline at end of file
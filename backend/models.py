@@ -11,13 +11,16 @@ db = SQLAlchemy()
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    no connection is made here, the engine connects on the first query.
+    tables are only created when create_tables is set
 '''
-def setup_db(app, database_path=database_path):
+def setup_db(app, database_path=database_path, create_tables=False):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     db.app = app
     db.init_app(app)
-    db.create_all()
+    if create_tables:
+        db.create_all()
 
 '''
 Question
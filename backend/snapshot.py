@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import mmap
+import bisect
+import struct
+
+'''
+Read-only question store backed by a memory-mapped snapshot file.
+
+File layout:
+  magic (8 bytes) | header length (uint32) | header (json)
+  offset table: one (offset, length) uint32 pair per question slot
+  data: one json record per question, same shape as Question.format()
+
+The header only holds the categories, the question id of every slot and
+the slots of each category, so loading a snapshot does not decode any
+question. Records are decoded one at a time when a route needs them.
+'''
+
+MAGIC = b'TRIVSNP1'
+PREFIX = struct.Struct('<8sI')
+OFFSET = struct.Struct('<II')
+
+
+'''
+export_snapshot(path, categories, questions)
+    writes categories (Category.format() dicts) and questions
+    (Question.format() dicts) to path. The file is written next to
+    path and renamed over it, so a serving SnapshotStore never sees
+    a half written snapshot.
+'''
+def export_snapshot(path, categories, questions):
+  questions = sorted(questions, key=lambda q: q['id'])
+
+  records = []
+  by_category = {}
+  for slot, question in enumerate(questions):
+    records.append(json.dumps(question, separators=(',', ':')).encode('utf-8'))
+    by_category.setdefault(str(question['category']), []).append(slot)
+
+  header = json.dumps({
+    'categories': {str(c['id']): c['type'] for c in categories},
+    'ids': [q['id'] for q in questions],
+    'by_category': by_category
+  }, separators=(',', ':')).encode('utf-8')
+
+  offset = PREFIX.size + len(header) + OFFSET.size * len(records)
+  tmp_path = path + '.tmp'
+  with open(tmp_path, 'wb') as f:
+    f.write(PREFIX.pack(MAGIC, len(header)))
+    f.write(header)
+    for record in records:
+      f.write(OFFSET.pack(offset, len(record)))
+      offset += len(record)
+    for record in records:
+      f.write(record)
+  os.replace(tmp_path, path)
+
+
+'''
+export_database(path)
+    writes a snapshot of the questions and categories tables to path
+'''
+def export_database(path):
+  from flaskr import create_app
+  from models import Question, Category
+
+  # always read from the database, even when TRIVIA_SNAPSHOT is set
+  # in the shell that re-exports the served snapshot
+  app = create_app({'SNAPSHOT_PATH': None})
+  with app.app_context():
+    categories = [c.format() for c in Category.query.all()]
+    questions = [q.format() for q in Question.query.all()]
+  export_snapshot(path, categories, questions)
+  return len(questions)
+
+
+class _Snapshot(object):
+
+  def __init__(self, path):
+    with open(path, 'rb') as f:
+      self.stat = os.fstat(f.fileno())
+      self.buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, header_length = PREFIX.unpack_from(self.buf, 0)
+    if magic != MAGIC:
+      raise ValueError('{} is not a trivia snapshot'.format(path))
+
+    try:
+      header = json.loads(self.buf[PREFIX.size:PREFIX.size + header_length])
+      self.categories = dict(header['categories'])
+      self.ids = list(header['ids'])
+      self.by_category = dict(header['by_category'])
+    except (KeyError, TypeError) as e:
+      raise ValueError('{} has a bad header: {!r}'.format(path, e))
+    self.table = PREFIX.size + header_length
+
+    # a partly copied file must not be served, check that the offset
+    # table and the last record are inside the file
+    if self.table + len(self.ids) * OFFSET.size > len(self.buf):
+      raise ValueError('{} is truncated in the offset table'.format(path))
+    if self.ids:
+      offset, length = OFFSET.unpack_from(self.buf, self.table + (len(self.ids) - 1) * OFFSET.size)
+      if offset + length > len(self.buf):
+        raise ValueError('{} is truncated in the question records'.format(path))
+
+  def record(self, slot):
+    offset, length = OFFSET.unpack_from(self.buf, self.table + slot * OFFSET.size)
+    return json.loads(self.buf[offset:offset + length])
+
+
+'''
+SnapshotStore
+    answers the read-only endpoints from a snapshot file. A new snapshot
+    exported over the same path is picked up by reload_if_changed().
+'''
+class SnapshotStore(object):
+
+  def __init__(self, path):
+    self.path = path
+    self._snapshot = _Snapshot(path)
+    self._rejected = None
+
+  def reload_if_changed(self):
+    try:
+      stat = os.stat(self.path)
+    except OSError:
+      # keep serving the current snapshot until a new one is in place
+      return False
+
+    current = self._snapshot.stat
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if key == (current.st_ino, current.st_mtime_ns, current.st_size) or \
+       key == self._rejected:
+      return False
+
+    try:
+      snapshot = _Snapshot(self.path)
+    except (ValueError, OSError, struct.error, KeyError, TypeError) as e:
+      # keep serving the current snapshot, and do not parse the same
+      # broken file again on every request
+      print('snapshot {} not loaded: {}'.format(self.path, e))
+      self._rejected = key
+      return False
+
+    # requests still holding the old snapshot keep their own reference,
+    # the old mapping is released once they are done with it
+    self._snapshot = snapshot
+    self._rejected = None
+    return True
+
+  def categories(self):
+    return dict(self._snapshot.categories)
+
+  def category_type(self, category_id):
+    return self._snapshot.categories.get(str(category_id))
+
+  def answer(self, question_id):
+    # slots are sorted by question id, see export_snapshot
+    snapshot = self._snapshot
+    slot = bisect.bisect_left(snapshot.ids, question_id)
+    if slot == len(snapshot.ids) or snapshot.ids[slot] != question_id:
+      return None
+    return snapshot.record(slot)['answer']
+
+  def answers(self):
+    # reads every record, which also pages the whole file in
+    snapshot = self._snapshot
+    return [(snapshot.ids[slot], snapshot.record(slot)['answer'])
+            for slot in range(len(snapshot.ids))]
+
+  def questions(self, page, page_size):
+    snapshot = self._snapshot
+    start = (page - 1) * page_size
+    end = min(start + page_size, len(snapshot.ids))
+    return [snapshot.record(slot) for slot in range(start, end)]
+
+  def questions_by_category(self, category_id):
+    snapshot = self._snapshot
+    slots = snapshot.by_category.get(str(category_id), [])
+    return [snapshot.record(slot) for slot in slots]
+
+  def search(self, term):
+    snapshot = self._snapshot
+    term = term.lower()
+    results = []
+    for slot in range(len(snapshot.ids)):
+      record = snapshot.record(slot)
+      if term in record['question'].lower():
+        results.append(record)
+    return results
+
+  def quiz_candidates(self, category_id=None, previous_questions=()):
+    '''
+    returns (snapshot, slots) for the questions that can still be asked,
+    the snapshot is returned so the caller decodes from the same file
+    '''
+    snapshot = self._snapshot
+    if category_id is None:
+      slots = range(len(snapshot.ids))
+    else:
+      slots = snapshot.by_category.get(str(category_id), [])
+
+    previous = set(previous_questions)
+    return snapshot, [slot for slot in slots if snapshot.ids[slot] not in previous]
+
+
+if __name__ == '__main__':
+  if len(sys.argv) != 2:
+    print('usage: python snapshot.py <snapshot file>')
+    sys.exit(1)
+  count = export_database(sys.argv[1])
+  print('wrote {} questions to {}'.format(count, sys.argv[1]))
@@ -1,10 +1,18 @@
+import io
 import os
+import shutil
+import struct
+import tempfile
 import unittest
 import json
+from contextlib import redirect_stdout
+from unittest import mock
 from flask_sqlalchemy import SQLAlchemy
 
-from flaskr import create_app
-from models import setup_db, Question, Category
+from flaskr import create_app, warmup
+from models import setup_db, db, Question, Category
+from snapshot import export_snapshot
+from answers import AnswerIndex, normalize_answer, within_distance
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -16,7 +24,7 @@ class TriviaTestCase(unittest.TestCase):
         self.client = self.app.test_client
         self.database_name = "trivia" #Set Database here
         self.database_path = "postgres://{}/{}".format('localhost:5432', self.database_name)
-        setup_db(self.app, self.database_path)
+        setup_db(self.app, self.database_path, create_tables=True)
 
         # binds the app to the current context
         with self.app.app_context():
@@ -255,6 +263,7 @@ class TriviaTestCase(unittest.TestCase):
         data = json.loads(res.data)
         self.assertIn("question", data)
         self.assertTrue(data["question"]["id"] > 0)
+        self.assertNotIn("answer", data["question"])
 
         # positive 2: One category
         res = self.client().post("/quizzes",
@@ -312,6 +321,405 @@ class TriviaTestCase(unittest.TestCase):
         data = json.loads(res.data)
         self.assertEqual(data, {})
 
+    # test check_answer
+    def test_check_answer(self):
+        question = Question(question="testQuestionAnswer",
+                            answer="The Palace of Versailles",
+                            category=self.testCategoryId,
+                            difficulty=1)
+        question.insert()
+
+        # positive: case, punctuation and articles are ignored
+        res = self.client().post("/quizzes/answer",
+                                 data=json.dumps({
+                                   "question_id": question.id,
+                                   "answer": "palace of versailles!"
+                                 }),
+                                 content_type="application/json")
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertTrue(data["correct"])
+        self.assertEqual(data["answer"], "The Palace of Versailles")
+
+        # negative: wrong answer
+        res = self.client().post("/quizzes/answer",
+                                 data=json.dumps({
+                                   "question_id": question.id,
+                                   "answer": "Buckingham Palace"
+                                 }),
+                                 content_type="application/json")
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertFalse(data["correct"])
+
+        # negative: a filler word of the answer
+        res = self.client().post("/quizzes/answer",
+                                 data=json.dumps({
+                                   "question_id": question.id,
+                                   "answer": "of"
+                                 }),
+                                 content_type="application/json")
+        data = json.loads(res.data)
+        self.assertFalse(data["correct"])
+
+        # negative: typos are not accepted by default
+        res = self.client().post("/quizzes/answer",
+                                 data=json.dumps({
+                                   "question_id": question.id,
+                                   "answer": "Versailes"
+                                 }),
+                                 content_type="application/json")
+        data = json.loads(res.data)
+        self.assertFalse(data["correct"])
+
+        # positive: one typo in a keyword when the server allows one
+        client = create_app({"ANSWER_MAX_DISTANCE": 1}).test_client
+        res = client().post("/quizzes/answer",
+                            data=json.dumps({
+                              "question_id": question.id,
+                              "answer": "Versailes"
+                            }),
+                            content_type="application/json")
+        data = json.loads(res.data)
+        self.assertTrue(data["correct"])
+
+        # negative: question does not exist
+        res = self.client().post("/quizzes/answer",
+                                 data=json.dumps({
+                                   "question_id": 999999,
+                                   "answer": "Versailles"
+                                 }),
+                                 content_type="application/json")
+        self.assertEqual(res.status_code, 404)
+
+        # negative: bad body
+        res = self.client().post("/quizzes/answer",
+                                 data=json.dumps({"answer": "Versailles"}),
+                                 content_type="application/json")
+        self.assertEqual(res.status_code, 400)
+
+
+    # test warmup
+    def test_warmup(self):
+        warmup(self.app)
+
+        answer_index = self.app.extensions["trivia_answers"]
+        entry = answer_index.entry(self.testQuestion.id)
+        self.assertEqual(entry.answer, "testAnswerDelete")
+
+        # a delete handled by another worker is not graded from the cache
+        question_id = self.testQuestion.id
+        Question.query.get(question_id).delete()
+        res = self.client().post("/quizzes/answer",
+                                 data=json.dumps({
+                                   "question_id": question_id,
+                                   "answer": "testAnswerDelete"
+                                 }),
+                                 content_type="application/json")
+        self.assertEqual(res.status_code, 404)
+
+
+class StartupTestCase(unittest.TestCase):
+    """This class represents the app startup test case, no database is used"""
+
+    def test_tables_not_created_by_default(self):
+        with mock.patch.object(db, "create_all") as create_all:
+            create_app()
+        create_all.assert_not_called()
+
+    def test_tables_created_with_flag(self):
+        with mock.patch.object(db, "create_all") as create_all:
+            create_app({"CREATE_TABLES": True})
+        create_all.assert_called_once_with()
+
+        with mock.patch.dict(os.environ, {"TRIVIA_CREATE_TABLES": "1"}), \
+             mock.patch.object(db, "create_all") as create_all:
+            create_app()
+        create_all.assert_called_once_with()
+
+    def test_profile_startup(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            create_app({"PROFILE_STARTUP": True})
+
+        lines = output.getvalue().splitlines()
+        steps = [line.split()[1] for line in lines if line.startswith("startup ")]
+        self.assertEqual(steps, ["flask", "setup_db", "routes", "total"])
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            create_app()
+        self.assertNotIn("startup ", output.getvalue())
+
+
+class SnapshotTestCase(unittest.TestCase):
+    """This class represents the read-only snapshot test case"""
+
+    def setUp(self):
+        """Write a snapshot and start the app on it, no database is used."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.snapshot_path = os.path.join(self.tmpdir, "trivia.snap")
+        self.categories = [{"id": 1, "type": "Science"},
+                           {"id": 2, "type": "Art"}]
+        self.questions = []
+        for i in range(1, 13):
+            self.questions.append({"id": i,
+                                   "question": "testQuestion" + str(i),
+                                   "answer": "testAnswer" + str(i),
+                                   "category": 1 if i <= 10 else 2,
+                                   "difficulty": 1})
+        export_snapshot(self.snapshot_path, self.categories, self.questions)
+
+        self.app = create_app({"SNAPSHOT_PATH": self.snapshot_path})
+        self.client = self.app.test_client
+
+    def tearDown(self):
+        """Executed after reach test"""
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_categories(self):
+        res = self.client().get("/categories")
+        self.assertEqual(res.status_code, 200)
+
+        data = json.loads(res.data)
+        self.assertEqual(data["categories"], {"1": "Science", "2": "Art"})
+
+    def test_get_questions(self):
+        res = self.client().get("/questions?page=2")
+        self.assertEqual(res.status_code, 200)
+
+        data = json.loads(res.data)
+        self.assertEqual(data["totalQuestions"], 2)
+        self.assertEqual(data["questions"][0], self.questions[10])
+
+        #negative, error
+        res = self.client().get("/questions?page=-1")
+        self.assertEqual(res.status_code, 422)
+
+    def test_get_questions_by_category(self):
+        res = self.client().get("/categories/2/questions")
+        self.assertEqual(res.status_code, 200)
+
+        data = json.loads(res.data)
+        self.assertEqual(data["currentCategory"], "Art")
+        self.assertEqual(data["questions"], self.questions[10:])
+
+        #negative, error
+        res = self.client().get("/categories/0/questions")
+        self.assertEqual(res.status_code, 422)
+
+    def test_search_question(self):
+        res = self.client().post("/questionsearch",
+                                 data=json.dumps({"searchTerm": "question12"}),
+                                 content_type="application/json")
+        self.assertEqual(res.status_code, 200)
+
+        data = json.loads(res.data)
+        self.assertEqual(data["totalQuestions"], 1)
+        self.assertEqual(data["questions"][0]["id"], 12)
+
+    def test_quizzes(self):
+        res = self.client().post("/quizzes",
+                                 data=json.dumps({
+                                   "previous_questions": [11],
+                                   "quiz_category": {"id": 2, "type": "Art"}
+                                 }),
+                                 content_type="application/json")
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data["question"]["id"], 12)
+        self.assertNotIn("answer", data["question"])
+
+        # no more questions
+        res = self.client().post("/quizzes",
+                                 data=json.dumps({
+                                   "previous_questions": [11, 12],
+                                   "quiz_category": {"id": 2, "type": "Art"}
+                                 }),
+                                 content_type="application/json")
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertEqual(data, {})
+
+    def test_writes_not_allowed(self):
+        res = self.client().delete("/questions/1")
+        self.assertEqual(res.status_code, 405)
+
+        res = self.client().post("/questions",
+                                 data=json.dumps(self.questions[0]),
+                                 content_type="application/json")
+        self.assertEqual(res.status_code, 405)
+
+    def test_check_answer(self):
+        res = self.client().post("/quizzes/answer",
+                                 data=json.dumps({
+                                   "question_id": 12,
+                                   "answer": "TestAnswer12."
+                                 }),
+                                 content_type="application/json")
+        self.assertEqual(res.status_code, 200)
+        data = json.loads(res.data)
+        self.assertTrue(data["correct"])
+        self.assertEqual(data["answer"], "testAnswer12")
+
+        res = self.client().post("/quizzes/answer",
+                                 data=json.dumps({
+                                   "question_id": 13,
+                                   "answer": "testAnswer13"
+                                 }),
+                                 content_type="application/json")
+        self.assertEqual(res.status_code, 404)
+
+        # negative: ids, answers and distances of the wrong type or range
+        for body in [{"question_id": 1.5, "answer": "testAnswer1"},
+                     {"question_id": True, "answer": "testAnswer1"},
+                     {"question_id": "1", "answer": "testAnswer1"},
+                     {"question_id": 2**31, "answer": "testAnswer1"},
+                     {"question_id": 0, "answer": "testAnswer1"},
+                     {"question_id": 1, "answer": None}]:
+            res = self.client().post("/quizzes/answer",
+                                     data=json.dumps(body),
+                                     content_type="application/json")
+            self.assertEqual(res.status_code, 400)
+
+    def test_warmup(self):
+        warmup(self.app)
+
+        # every answer is in the index, graded without reading the snapshot
+        answer_index = self.app.extensions["trivia_answers"]
+        answer_index.load_answer = None
+        for question in self.questions:
+            self.assertEqual(answer_index.check(question["id"], question["answer"]),
+                             (True, question["answer"]))
+
+    def test_snapshot_reload(self):
+        self.categories.append({"id": 3, "type": "History"})
+        export_snapshot(self.snapshot_path, self.categories, self.questions)
+
+        res = self.client().get("/categories")
+        data = json.loads(res.data)
+        self.assertEqual(data["categories"]["3"], "History")
+
+    def test_export_ignores_served_snapshot(self):
+        # export_database builds its app this way, it must stay in db mode
+        # while TRIVIA_SNAPSHOT is set for the server
+        os.environ["TRIVIA_SNAPSHOT"] = self.snapshot_path
+        try:
+            app = create_app({"SNAPSHOT_PATH": None})
+        finally:
+            del os.environ["TRIVIA_SNAPSHOT"]
+        self.assertIn("sqlalchemy", app.extensions)
+
+    def test_snapshot_reload_broken_file(self):
+        with open(self.snapshot_path, "rb") as f:
+            exported = f.read()
+        header = b"{}"
+        broken = [b"", b"not a snapshot file", b"TRIVSNP1",
+                  # valid prefix, header without the expected keys
+                  struct.pack("<8sI", b"TRIVSNP1", len(header)) + header,
+                  # partly copied files
+                  exported[:-20],
+                  exported[:len(exported) // 2]]
+        for content in broken:
+            with open(self.snapshot_path + ".tmp", "wb") as f:
+                f.write(content)
+            os.replace(self.snapshot_path + ".tmp", self.snapshot_path)
+
+            # the current snapshot keeps being served
+            res = self.client().get("/categories")
+            self.assertEqual(res.status_code, 200)
+            data = json.loads(res.data)
+            self.assertEqual(data["categories"], {"1": "Science", "2": "Art"})
+
+            res = self.client().get("/questions?page=2")
+            self.assertEqual(res.status_code, 200)
+            data = json.loads(res.data)
+            self.assertEqual(data["questions"], self.questions[10:])
+
+
+class AnswerIndexTestCase(unittest.TestCase):
+    """This class represents the answer normalization test case"""
+
+    def setUp(self):
+        self.answers = {1: "The Palace of Versailles", 2: "Maya Angelou",
+                        3: "George Washington Carver", 5: "Apollo 13",
+                        6: "1990"}
+        self.index = AnswerIndex(self.answers.get)
+        self.fuzzy_index = AnswerIndex(self.answers.get, 1)
+
+    def test_normalize_answer(self):
+        self.assertEqual(normalize_answer("The Palace of Versailles!"), "palace of versailles")
+        self.assertEqual(normalize_answer("  MAYA   angelou. "), "maya angelou")
+        # punctuation separates words, apostrophes do not
+        self.assertEqual(normalize_answer("Jean-Paul Sartre"), "jean paul sartre")
+        self.assertEqual(normalize_answer("Brazil,Germany"), "brazil germany")
+        self.assertEqual(normalize_answer("Georgia O'Keeffe"), "georgia okeeffe")
+        self.assertEqual(normalize_answer("Georgia O\u2019Keeffe"), "georgia okeeffe")
+        # an answer made only of articles is kept
+        self.assertEqual(normalize_answer("A"), "a")
+
+    def test_within_distance(self):
+        self.assertTrue(within_distance("angelou", "angelou", 0))
+        self.assertTrue(within_distance("angelu", "angelou", 1))
+        self.assertFalse(within_distance("angel", "angelou", 1))
+        self.assertTrue(within_distance("agnelou", "angelou", 2))
+        self.assertFalse(within_distance("", "angelou", 2))
+
+    def test_check(self):
+        self.assertEqual(self.index.check(2, "angelou"), (True, "Maya Angelou"))
+        self.assertEqual(self.index.check(2, "Maya Angelu"), (False, "Maya Angelou"))
+        self.assertEqual(self.fuzzy_index.check(2, "Maya Angelu"), (True, "Maya Angelou"))
+        self.assertEqual(self.index.check(1, ""), (False, "The Palace of Versailles"))
+        self.assertIsNone(self.index.check(4, "anything"))
+
+    def test_check_keywords(self):
+        # filler words of the answer are not accepted on their own
+        self.assertFalse(self.index.check(1, "of")[0])
+        self.assertFalse(self.index.check(1, "the")[0])
+        self.assertTrue(self.index.check(1, "Versailles")[0])
+
+        # fuzzy matching applies to each keyword
+        self.assertFalse(self.index.check(1, "Versailes")[0])
+        self.assertTrue(self.fuzzy_index.check(1, "Versailes")[0])
+        self.assertTrue(self.fuzzy_index.check(3, "Carvr")[0])
+        # four letter keywords get one edit, even with a larger max_distance
+        index = AnswerIndex(self.answers.get, 2)
+        self.assertTrue(index.check(2, "Mara")[0])
+        self.assertFalse(index.check(2, "Mxyx")[0])
+
+    def test_check_punctuation(self):
+        index = AnswerIndex({1: "Jean-Paul Sartre", 2: "Brazil,Germany"}.get)
+        self.assertTrue(index.check(1, "Jean Paul Sartre")[0])
+        self.assertTrue(index.check(1, "jean-paul sartre")[0])
+        self.assertTrue(index.check(2, "Germany")[0])
+
+    def test_check_numbers(self):
+        # numbers never allow typos
+        self.assertTrue(self.fuzzy_index.check(5, "Apollo 13")[0])
+        self.assertTrue(self.fuzzy_index.check(5, "Apolo 13")[0])
+        self.assertFalse(self.fuzzy_index.check(5, "Apollo 14")[0])
+        self.assertFalse(self.fuzzy_index.check(6, "1991")[0])
+        self.assertTrue(self.fuzzy_index.check(6, "1990")[0])
+
+    def test_max_distance_capped(self):
+        index = AnswerIndex(self.answers.get, 5)
+        self.assertEqual(index.max_distance, 2)
+
+    def test_deleted_elsewhere(self):
+        index = AnswerIndex(self.answers.get, exists=lambda id: id in self.answers)
+        self.assertTrue(index.check(2, "angelou")[0])
+
+        # deleted without going through this index
+        del self.answers[2]
+        self.assertIsNone(index.check(2, "angelou"))
+
+    def test_add_and_remove(self):
+        self.index.add(4, "Lake Victoria")
+        self.assertTrue(self.index.check(4, "lake victoria")[0])
+
+        self.index.remove(4)
+        self.assertIsNone(self.index.check(4, "lake victoria"))
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":